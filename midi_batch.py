@@ -0,0 +1,408 @@
+# midi_batch.py - Decodificación por lotes de mensajes MIDI entrantes en arrays compactos
+import os
+import numpy as np
+from typing import List, Optional, Tuple, Iterable
+import logging
+
+# Estructura de cada evento: tiempo absoluto, bytes de estado/datos e índice de SysEx
+EVENT_DTYPE = np.dtype([
+    ('time', np.float64),    # Segundos desde el inicio de la captura
+    ('status', np.uint8),    # Byte de estado completo (p. ej. 0x90)
+    ('channel', np.uint8),   # Canal 0-15, o NO_CHANNEL para mensajes de sistema
+    ('data1', np.uint8),     # Primer byte de datos (0 si no existe)
+    ('data2', np.uint8),     # Segundo byte de datos (0 si no existe)
+    ('sysex', np.int32),     # Índice en el almacén de SysEx, o -1
+])
+
+NO_CHANNEL = 0xFF
+
+# Nombres de los ficheros dentro de un directorio de grabación
+EVENTS_FILE = 'events.npy'
+SYSEX_OFFSETS_FILE = 'sysex_offsets.npy'
+SYSEX_DATA_FILE = 'sysex_data.npy'
+
+
+class MidiBatch:
+    """
+    Lote de mensajes MIDI almacenado en forma columnar.
+
+    Los mensajes de canal y de sistema se guardan en un array estructurado de NumPy
+    (ver EVENT_DTYPE). Los mensajes SysEx completos se guardan aparte en un único
+    bloque de bytes con un array de offsets, de modo que el SysEx i ocupa
+    sysex_data[sysex_offsets[i]:sysex_offsets[i + 1]].
+    """
+
+    def __init__(self, events: Optional[np.ndarray] = None,
+                 sysex_offsets: Optional[np.ndarray] = None,
+                 sysex_data: Optional[np.ndarray] = None, validate: bool = True):
+        """
+        Inicializa un lote a partir de arrays ya construidos.
+
+        Args:
+            events: Array estructurado con dtype EVENT_DTYPE
+            sysex_offsets: Offsets (int64) de cada SysEx en sysex_data, con un elemento final extra
+            sysex_data: Bytes (uint8) de todos los SysEx concatenados
+            validate: Si es True, recorre además los arrays completos para comprobar
+                      los índices y offsets de SysEx (coste O(n))
+        """
+        self.events = events if events is not None else np.empty(0, dtype=EVENT_DTYPE)
+        self.sysex_offsets = sysex_offsets if sysex_offsets is not None else np.zeros(1, dtype=np.int64)
+        self.sysex_data = sysex_data if sysex_data is not None else np.empty(0, dtype=np.uint8)
+
+        self._validate(validate)
+        self.logger = logging.getLogger("MidiBatch")
+
+    def _validate(self, full: bool):
+        """
+        Comprueba la coherencia entre los eventos y el almacén de SysEx.
+
+        Las comprobaciones de dtype, forma y extremos de los offsets son O(1) y se
+        hacen siempre; las que recorren los arrays completos solo si full es True.
+
+        Args:
+            full: Si es True, comprueba también todos los offsets e índices de SysEx
+
+        Raises:
+            ValueError: Si algún array tiene un dtype o forma inválidos, o si los
+                        índices y offsets de SysEx no son coherentes entre sí
+        """
+        if self.events.dtype != EVENT_DTYPE or self.events.ndim != 1:
+            raise ValueError(f"dtype de eventos inválido: {self.events.dtype}")
+        if self.sysex_offsets.dtype != np.int64 or self.sysex_offsets.ndim != 1:
+            raise ValueError(f"dtype de offsets de SysEx inválido: {self.sysex_offsets.dtype}")
+        if self.sysex_data.dtype != np.uint8 or self.sysex_data.ndim != 1:
+            raise ValueError(f"dtype de datos de SysEx inválido: {self.sysex_data.dtype}")
+
+        if len(self.sysex_offsets) == 0 or self.sysex_offsets[0] != 0:
+            raise ValueError("Los offsets de SysEx deben empezar en 0")
+        if self.sysex_offsets[-1] != len(self.sysex_data):
+            raise ValueError(
+                f"El último offset de SysEx ({self.sysex_offsets[-1]}) no coincide "
+                f"con el tamaño de los datos ({len(self.sysex_data)})"
+            )
+        if not full:
+            return
+
+        if np.any(np.diff(self.sysex_offsets) < 0):
+            raise ValueError("Los offsets de SysEx deben ser crecientes")
+
+        if len(self.events):
+            indices = self.events['sysex']
+            if indices.min() < -1 or indices.max() >= self.sysex_count:
+                raise ValueError(
+                    f"Índices de SysEx fuera de rango (almacén con {self.sysex_count} mensajes)"
+                )
+
+    @classmethod
+    def from_messages(cls, messages: Iterable[Tuple[List[int], float]], start_time: float = 0.0) -> 'MidiBatch':
+        """
+        Decodifica una lista de mensajes tal como los devuelve MidiDevice.read_message.
+
+        Los mensajes vacíos se descartan y su tiempo se acumula en el siguiente mensaje.
+
+        Args:
+            messages: Iterable de tuplas (bytes del mensaje, tiempo desde el mensaje anterior)
+            start_time: Tiempo absoluto asignado antes del primer mensaje
+
+        Returns:
+            Instancia de MidiBatch
+        """
+        decoded = []
+        pending = 0.0
+        for message, delta in messages:
+            pending += delta
+            if message:
+                decoded.append((message, pending))
+                pending = 0.0
+        n = len(decoded)
+
+        deltas = np.empty(n, dtype=np.float64)
+        status = np.zeros(n, dtype=np.uint8)
+        data1 = np.zeros(n, dtype=np.uint8)
+        data2 = np.zeros(n, dtype=np.uint8)
+        sysex = np.full(n, -1, dtype=np.int32)
+        sysex_chunks = []
+
+        for i, (message, delta) in enumerate(decoded):
+            deltas[i] = delta
+            status[i] = message[0]
+            if message[0] == 0xF0:
+                # SysEx: se guarda el mensaje completo en el almacén aparte
+                sysex[i] = len(sysex_chunks)
+                sysex_chunks.append(message)
+                continue
+            if len(message) > 1:
+                data1[i] = message[1]
+            if len(message) > 2:
+                data2[i] = message[2]
+
+        events = np.empty(n, dtype=EVENT_DTYPE)
+        events['time'] = start_time + np.cumsum(deltas)
+        events['status'] = status
+        events['channel'] = np.where(status < 0xF0, status & 0x0F, NO_CHANNEL)
+        events['data1'] = data1
+        events['data2'] = data2
+        events['sysex'] = sysex
+
+        lengths = np.fromiter((len(chunk) for chunk in sysex_chunks), dtype=np.int64, count=len(sysex_chunks))
+        sysex_offsets = np.zeros(len(sysex_chunks) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=sysex_offsets[1:])
+        if sysex_chunks:
+            sysex_data = np.fromiter(
+                (byte for chunk in sysex_chunks for byte in chunk),
+                dtype=np.uint8, count=int(sysex_offsets[-1])
+            )
+        else:
+            sysex_data = np.empty(0, dtype=np.uint8)
+
+        return cls(events, sysex_offsets, sysex_data, validate=False)
+
+    @classmethod
+    def concatenate(cls, batches: List['MidiBatch']) -> 'MidiBatch':
+        """
+        Une varios lotes consecutivos en uno solo.
+
+        Los tiempos no se desplazan: cada lote debe tener ya tiempos absolutos
+        sobre el mismo reloj, como los que devuelve MidiDevice.read_batch.
+
+        Args:
+            batches: Lista de lotes en orden cronológico
+
+        Returns:
+            Nuevo lote con todos los eventos
+        """
+        if not batches:
+            return cls()
+
+        events = np.concatenate([batch.events for batch in batches])
+        sysex_data = np.concatenate([batch.sysex_data for batch in batches])
+
+        # Desplazar los índices y offsets de SysEx de cada lote
+        offsets = [np.zeros(1, dtype=np.int64)]
+        sysex_base = 0
+        data_base = 0
+        position = 0
+        for batch in batches:
+            count = len(batch.events)
+            indices = events['sysex'][position:position + count]
+            indices[indices >= 0] += sysex_base
+            offsets.append(batch.sysex_offsets[1:] + data_base)
+            sysex_base += batch.sysex_count
+            data_base += len(batch.sysex_data)
+            position += count
+
+        return cls(events, np.concatenate(offsets), sysex_data, validate=False)
+
+    def __len__(self) -> int:
+        return len(self.events)
+
+    @property
+    def sysex_count(self) -> int:
+        """Número de mensajes SysEx almacenados."""
+        return len(self.sysex_offsets) - 1
+
+    @property
+    def time(self) -> np.ndarray:
+        return self.events['time']
+
+    @property
+    def status(self) -> np.ndarray:
+        return self.events['status']
+
+    @property
+    def channel(self) -> np.ndarray:
+        return self.events['channel']
+
+    @property
+    def data1(self) -> np.ndarray:
+        return self.events['data1']
+
+    @property
+    def data2(self) -> np.ndarray:
+        return self.events['data2']
+
+    @property
+    def message_type(self) -> np.ndarray:
+        """Tipo de mensaje: nibble alto para mensajes de canal, byte completo para los de sistema."""
+        status = self.events['status']
+        return np.where(status < 0xF0, status & 0xF0, status)
+
+    @property
+    def has_data1(self) -> np.ndarray:
+        """Máscara de los eventos que llevan primer byte de datos (excluye SysEx y mensajes de un byte)."""
+        status = self.events['status']
+        return (status < 0xF0) | (status == 0xF1) | (status == 0xF2) | (status == 0xF3)
+
+    def get_sysex(self, index: int) -> bytes:
+        """
+        Obtiene los bytes de un mensaje SysEx del almacén.
+
+        Args:
+            index: Índice del SysEx (valor del campo 'sysex' de un evento)
+
+        Returns:
+            Bytes del mensaje SysEx completo (incluyendo 0xF0 y 0xF7)
+        """
+        if not 0 <= index < self.sysex_count:
+            raise IndexError(f"Índice de SysEx fuera de rango: {index}")
+        start, end = self.sysex_offsets[index], self.sysex_offsets[index + 1]
+        return self.sysex_data[start:end].tobytes()
+
+    def get_message(self, index: int) -> List[int]:
+        """
+        Reconstruye un mensaje en el formato de lista de enteros usado por MidiDevice.
+
+        Args:
+            index: Posición del evento en el lote
+
+        Returns:
+            Lista de enteros con el mensaje MIDI
+        """
+        event = self.events[index]
+        if event['sysex'] >= 0:
+            return list(self.get_sysex(int(event['sysex'])))
+
+        status = int(event['status'])
+        length = _message_length(status)
+        return [status, int(event['data1']), int(event['data2'])][:length]
+
+    def filter(self, mask: np.ndarray) -> 'MidiBatch':
+        """
+        Devuelve un nuevo lote con los eventos seleccionados por una máscara booleana.
+
+        Solo se conservan los SysEx referenciados por los eventos seleccionados.
+
+        Args:
+            mask: Array booleano de la misma longitud que el lote
+
+        Returns:
+            Nuevo lote filtrado
+        """
+        mask = np.asarray(mask, dtype=bool)
+        if mask.shape != self.events.shape:
+            raise ValueError(f"Tamaño de máscara inválido: {mask.shape} (esperado {self.events.shape})")
+
+        events = self.events[mask]
+        kept = events['sysex'][events['sysex'] >= 0]
+        if len(kept) == 0:
+            return MidiBatch(events, validate=False)
+
+        starts = self.sysex_offsets[kept]
+        ends = self.sysex_offsets[kept + 1]
+        sysex_data = np.concatenate([self.sysex_data[s:e] for s, e in zip(starts, ends)])
+        sysex_offsets = np.zeros(len(kept) + 1, dtype=np.int64)
+        np.cumsum(ends - starts, out=sysex_offsets[1:])
+
+        events['sysex'][events['sysex'] >= 0] = np.arange(len(kept), dtype=np.int32)
+        return MidiBatch(events, sysex_offsets, sysex_data, validate=False)
+
+    def select(self, message_type: Optional[int] = None, channel: Optional[int] = None,
+               data1: Optional[int] = None, start: Optional[float] = None,
+               end: Optional[float] = None) -> 'MidiBatch':
+        """
+        Filtra el lote por tipo de mensaje, canal, primer byte de datos y/o rango de tiempo.
+
+        Args:
+            message_type: Tipo de mensaje (p. ej. 0x90 para Note On, 0xB0 para Control Change)
+            channel: Canal MIDI (0-15)
+            data1: Valor del primer byte de datos (nota o número de controlador); solo
+                   coincide con eventos que tienen ese byte (ver has_data1)
+            start: Tiempo mínimo (inclusive) en segundos
+            end: Tiempo máximo (exclusive) en segundos
+
+        Returns:
+            Nuevo lote filtrado
+        """
+        mask = np.ones(len(self.events), dtype=bool)
+        if message_type is not None:
+            mask &= self.message_type == message_type
+        if channel is not None:
+            mask &= self.events['channel'] == channel
+        if data1 is not None:
+            mask &= self.has_data1 & (self.events['data1'] == data1)
+        if start is not None:
+            mask &= self.events['time'] >= start
+        if end is not None:
+            mask &= self.events['time'] < end
+        return self.filter(mask)
+
+    def note_ons(self, channel: Optional[int] = None) -> 'MidiBatch':
+        """
+        Obtiene los Note On reales (velocidad > 0; Note On con velocidad 0 equivale a Note Off).
+
+        Args:
+            channel: Canal MIDI (0-15) o None para todos
+
+        Returns:
+            Nuevo lote con los Note On
+        """
+        mask = (self.message_type == 0x90) & (self.events['data2'] > 0)
+        if channel is not None:
+            mask &= self.events['channel'] == channel
+        return self.filter(mask)
+
+    def control_changes(self, controller: Optional[int] = None, channel: Optional[int] = None) -> 'MidiBatch':
+        """
+        Obtiene los mensajes de Control Change.
+
+        Args:
+            controller: Número de controlador (0-127) o None para todos
+            channel: Canal MIDI (0-15) o None para todos
+
+        Returns:
+            Nuevo lote con los Control Change
+        """
+        return self.select(0xB0, channel=channel, data1=controller)
+
+    def save(self, directory: str):
+        """
+        Guarda el lote en un directorio como ficheros .npy que pueden abrirse con mmap.
+
+        Args:
+            directory: Ruta del directorio de grabación
+        """
+        os.makedirs(directory, exist_ok=True)
+        np.save(os.path.join(directory, EVENTS_FILE), self.events)
+        np.save(os.path.join(directory, SYSEX_OFFSETS_FILE), self.sysex_offsets)
+        np.save(os.path.join(directory, SYSEX_DATA_FILE), self.sysex_data)
+        self.logger.info(f"Lote guardado en {directory}: {len(self)} eventos, {self.sysex_count} SysEx")
+
+    @classmethod
+    def load(cls, directory: str, mmap: bool = True, validate: bool = False) -> 'MidiBatch':
+        """
+        Carga un lote guardado con save().
+
+        Args:
+            directory: Ruta del directorio de grabación
+            mmap: Si es True, los arrays se mapean en memoria en modo solo lectura
+                  en lugar de leerse completos, útil para grabaciones largas
+            validate: Si es True, recorre los arrays completos para comprobar los
+                      índices y offsets de SysEx; obliga a leer todo el fichero de eventos
+
+        Returns:
+            Instancia de MidiBatch
+        """
+        mmap_mode = 'r' if mmap else None
+        events = np.load(os.path.join(directory, EVENTS_FILE), mmap_mode=mmap_mode)
+        sysex_offsets = np.load(os.path.join(directory, SYSEX_OFFSETS_FILE), mmap_mode=mmap_mode)
+        sysex_data = np.load(os.path.join(directory, SYSEX_DATA_FILE), mmap_mode=mmap_mode)
+        return cls(events, sysex_offsets, sysex_data, validate=validate)
+
+
+def _message_length(status: int) -> int:
+    """
+    Obtiene la longitud en bytes de un mensaje MIDI que no es SysEx a partir de su estado.
+
+    Args:
+        status: Byte de estado
+
+    Returns:
+        Número de bytes del mensaje, incluyendo el de estado
+    """
+    if status < 0xF0:
+        return 2 if (status & 0xF0) in (0xC0, 0xD0) else 3
+    if status in (0xF1, 0xF3):
+        return 2
+    if status == 0xF2:
+        return 3
+    return 1
@@ -1,9 +1,12 @@
 # midi_device.py - Clase base para todos los dispositivos MIDI
 import rtmidi
 import time
-from typing import List, Dict, Optional, Tuple, Union, Any
+from typing import List, Dict, Optional, Tuple, Union, Any, TYPE_CHECKING
 import logging
 
+if TYPE_CHECKING:
+    from midi_batch import MidiBatch
+
 # Configuración de logging
 logging.basicConfig(
     level=logging.INFO,
@@ -28,6 +31,9 @@ class MidiDevice:
         self.device_name = device_name
         self.logger = logging.getLogger(f"MidiDevice.{device_name}")
         
+        # Reloj absoluto de los lotes leídos con read_batch (segundos)
+        self.batch_time = 0.0
+        
         # Inicializar MIDI in/out
         self.midiin = rtmidi.MidiIn()
         self.midiout = rtmidi.MidiOut()
@@ -115,6 +121,60 @@ class MidiDevice:
             return msg_n_time
         return None
     
+    def set_capture_types(self, sysex: bool = False, timing: bool = False, active_sense: bool = False):
+        """
+        Indica qué tipos de mensaje de entrada se reciben en lugar de descartarse.
+        
+        Por defecto rtmidi descarta SysEx, reloj de sincronización y active sensing,
+        así que read_message y read_batch no los devuelven hasta activarlos aquí.
+        Solo afecta a los mensajes que lleguen después de la llamada.
+        
+        Args:
+            sysex: Recibir mensajes SysEx
+            timing: Recibir mensajes de reloj (timing clock, MTC)
+            active_sense: Recibir mensajes de active sensing
+        """
+        self.midiin.ignore_types(sysex=not sysex, timing=not timing, active_sense=not active_sense)
+        self.logger.info(f"Captura de entrada: sysex={sysex}, timing={timing}, active_sense={active_sense}")
+    
+    def read_batch(self, max_messages: Optional[int] = None, start_time: Optional[float] = None) -> 'MidiBatch':
+        """
+        Lee todos los mensajes MIDI de entrada pendientes y los decodifica en un lote compacto.
+        
+        Los tiempos del lote son absolutos y continúan el reloj de la lectura anterior
+        (self.batch_time), de modo que los lotes sucesivos pueden unirse con
+        MidiBatch.concatenate manteniendo la columna de tiempo creciente.
+        Los mensajes SysEx y de reloj solo aparecen si se han activado antes con
+        set_capture_types.
+        Requiere NumPy (ver requirements-analysis.txt).
+        
+        Args:
+            max_messages: Número máximo de mensajes a leer (None para vaciar la cola)
+            start_time: Reinicia el reloj a este tiempo antes de leer (None para continuar)
+            
+        Returns:
+            MidiBatch con los mensajes leídos (vacío si no hay ninguno)
+        """
+        try:
+            from midi_batch import MidiBatch
+        except ImportError as e:
+            raise ImportError("read_batch requiere NumPy: pip install -r requirements-analysis.txt") from e
+        
+        if start_time is not None:
+            self.batch_time = start_time
+        
+        messages = []
+        while max_messages is None or len(messages) < max_messages:
+            msg_n_time = self.read_message()
+            if msg_n_time is None:
+                break
+            messages.append(msg_n_time)
+        
+        batch = MidiBatch.from_messages(messages, self.batch_time)
+        if len(batch):
+            self.batch_time = float(batch.time[-1])
+        return batch
+    
     def close(self):
         """Cierra los puertos MIDI abiertos."""
         self.midiout.close_port()
@@ -0,0 +1,5 @@
+# conftest.py - Permite importar los módulos de la raíz del repositorio desde los tests
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
@@ -0,0 +1,167 @@
+# test_midi_batch.py - Tests del decodificador de lotes MIDI
+import logging
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from midi_batch import MidiBatch, EVENT_DTYPE, NO_CHANNEL
+
+MESSAGES = [
+    ([0x90, 60, 100], 0.0),
+    ([0xB1, 7, 64], 0.5),
+    ([0xF0, 0x40, 0x01, 0x02, 0xF7], 0.1),
+    ([0x90, 60, 0], 0.2),
+    ([0xC2, 5], 0.1),
+    ([0xF8], 0.25),
+    ([0xF0, 0x41, 0xF7], 0.25),
+]
+
+
+def messages_of(batch):
+    return [batch.get_message(i) for i in range(len(batch))]
+
+
+def test_from_messages_decodes_columns_and_round_trips():
+    batch = MidiBatch.from_messages(MESSAGES, start_time=10.0)
+
+    assert messages_of(batch) == [message for message, _ in MESSAGES]
+    assert np.allclose(batch.time, [10.0, 10.5, 10.6, 10.8, 10.9, 11.15, 11.4])
+    assert list(batch.channel) == [0, 1, NO_CHANNEL, 0, 2, NO_CHANNEL, NO_CHANNEL]
+    assert list(batch.events['sysex']) == [-1, -1, 0, -1, -1, -1, 1]
+    assert batch.sysex_count == 2
+    assert batch.get_sysex(1) == bytes([0xF0, 0x41, 0xF7])
+
+
+def test_from_messages_drops_empty_messages_and_keeps_their_delta():
+    batch = MidiBatch.from_messages([([0x90, 60, 100], 0.5), ([], 0.25), ([0x80, 60, 0], 0.25), ([], 1.0)])
+
+    assert messages_of(batch) == [[0x90, 60, 100], [0x80, 60, 0]]
+    assert np.allclose(batch.time, [0.5, 1.0])
+
+
+def test_concatenate_rebases_sysex_from_several_batches():
+    first = MidiBatch.from_messages(MESSAGES[:3])
+    second = MidiBatch.from_messages(MESSAGES[3:], start_time=float(first.time[-1]))
+
+    joined = MidiBatch.concatenate([first, MidiBatch(), second])
+
+    assert messages_of(joined) == [message for message, _ in MESSAGES]
+    assert list(joined.events['sysex']) == [-1, -1, 0, -1, -1, -1, 1]
+    assert list(joined.sysex_offsets) == [0, 5, 8]
+    assert np.all(np.diff(joined.time) >= 0)
+
+
+def test_filter_keeps_only_referenced_sysex():
+    batch = MidiBatch.from_messages(MESSAGES)
+
+    filtered = batch.select(start=0.7)
+
+    assert messages_of(filtered) == [message for message, _ in MESSAGES[3:]]
+    assert filtered.sysex_count == 1
+    assert list(filtered.sysex_offsets) == [0, 3]
+    assert filtered.get_sysex(0) == bytes([0xF0, 0x41, 0xF7])
+
+    no_sysex = batch.filter(batch.status != 0xF0)
+    assert no_sysex.sysex_count == 0
+    assert len(no_sysex.sysex_data) == 0
+
+
+def test_select_data1_ignores_events_without_data_bytes():
+    batch = MidiBatch.from_messages([
+        ([0xB0, 0, 3], 0.0),
+        ([0xF8], 0.1),
+        ([0xF0, 0x41, 0xF7], 0.1),
+        ([0x90, 0, 90], 0.1),
+    ])
+
+    assert messages_of(batch.select(data1=0)) == [[0xB0, 0, 3], [0x90, 0, 90]]
+    assert messages_of(batch.control_changes(0)) == [[0xB0, 0, 3]]
+
+
+def test_note_ons_excludes_zero_velocity():
+    batch = MidiBatch.from_messages(MESSAGES)
+
+    note_ons = batch.note_ons()
+
+    assert messages_of(note_ons) == [[0x90, 60, 100]]
+    assert messages_of(batch.control_changes(7, channel=1)) == [[0xB1, 7, 64]]
+
+
+@pytest.mark.parametrize("messages", [MESSAGES, MESSAGES[:2]])
+def test_save_load_round_trip(tmp_path, messages):
+    batch = MidiBatch.from_messages(messages)
+    batch.save(str(tmp_path))
+
+    loaded = MidiBatch.load(str(tmp_path), mmap=True)
+    validated = MidiBatch.load(str(tmp_path), mmap=True, validate=True)
+
+    assert isinstance(loaded.events, np.memmap)
+    assert messages_of(loaded) == [message for message, _ in messages]
+    assert np.array_equal(loaded.time, batch.time)
+    assert loaded.sysex_count == batch.sysex_count
+    assert messages_of(validated) == messages_of(loaded)
+
+
+def test_init_rejects_inconsistent_sysex_store():
+    events = MidiBatch.from_messages(MESSAGES).events
+
+    with pytest.raises(ValueError):
+        MidiBatch(events)
+    MidiBatch(events, validate=False)
+    with pytest.raises(ValueError):
+        MidiBatch(np.empty(0, dtype=EVENT_DTYPE), np.array([0, 3, 2, 3], dtype=np.int64), np.zeros(3, dtype=np.uint8))
+    with pytest.raises(ValueError):
+        MidiBatch(np.empty(0, dtype=EVENT_DTYPE), np.array([0, 4], dtype=np.int64), np.zeros(3, dtype=np.uint8))
+    with pytest.raises(ValueError):
+        MidiBatch(np.empty(0, dtype=EVENT_DTYPE), np.array([1], dtype=np.int64), np.zeros(1, dtype=np.uint8))
+    with pytest.raises(ValueError):
+        MidiBatch(np.empty(0, dtype=EVENT_DTYPE), np.zeros(1, dtype=np.int32))
+    with pytest.raises(ValueError):
+        MidiBatch(np.empty(0, dtype=EVENT_DTYPE), sysex_data=np.zeros(0, dtype=np.int16))
+
+
+class FakeMidiIn:
+    """Entrada MIDI simulada que devuelve los mensajes de una lista."""
+
+    def __init__(self, messages):
+        self.messages = list(messages)
+        self.ignored = None
+
+    def ignore_types(self, sysex=True, timing=True, active_sense=True):
+        self.ignored = (sysex, timing, active_sense)
+
+    def get_message(self):
+        return self.messages.pop(0) if self.messages else None
+
+
+def make_device(messages):
+    pytest.importorskip("rtmidi")
+    from midi_device import MidiDevice
+
+    device = MidiDevice.__new__(MidiDevice)
+    device.logger = logging.getLogger("MidiDevice.test")
+    device.port_in = 0
+    device.batch_time = 0.0
+    device.midiin = FakeMidiIn(messages)
+    return device
+
+
+def test_set_capture_types_enables_sysex_in_rtmidi():
+    device = make_device([])
+
+    device.set_capture_types(sysex=True)
+
+    assert device.midiin.ignored == (False, True, True)
+
+
+def test_read_batch_keeps_running_clock():
+    device = make_device(MESSAGES[:3])
+
+    first = device.read_batch()
+    empty = device.read_batch()
+    device.midiin.messages.extend(MESSAGES[3:])
+    second = device.read_batch()
+
+    assert len(empty) == 0
+    joined = MidiBatch.concatenate([first, empty, second])
+    assert np.allclose(joined.time, [0.0, 0.5, 0.6, 0.8, 0.9, 1.15, 1.4])